@@ -1,9 +1,69 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-from utils.db import load_table
+from utils.db import load_table, column_options
+from utils.export import csv_bytes
+
+# Measure-level KPIs summed per (country, year); nutrient surpluses are averaged
+KPI_MEASURE_LABELS = {
+    "Total greenhouse gas emissions": "GHG Emissions",
+    "Agriculture freshwater abstraction": "Water Use",
+    "Arable land": "Arable Land",
+}
+KPI_NUTRIENT_LABELS = {
+    "Nitrogen": "Nitrogen Surplus",
+    "Phosphorus": "Phosphorus Surplus",
+}
+
+
+@st.cache_data
+def _kpi_frame(countries: tuple, years: tuple) -> pd.DataFrame:
+    """Build the KPI grid for the selected countries/years in two grouped passes."""
+    agri = load_table("agri")
+    energy = load_table("energy")
+
+    agri_filtered = agri[agri["Reference area"].isin(countries) & agri["Year"].isin(years)]
+    energy_filtered = energy[energy["Reference area"].isin(countries) & energy["Year"].isin(years)]
+
+    nutrient_means = agri_filtered.pivot_table(
+        "Value", ["Reference area", "Year"], "Nutrients", aggfunc="mean", observed=True
+    ).rename(columns=KPI_NUTRIENT_LABELS)
+    measure_sums = agri_filtered[agri_filtered["Measure"].isin(KPI_MEASURE_LABELS)].pivot_table(
+        "Value", ["Reference area", "Year"], "Measure", aggfunc="sum", observed=True
+    ).rename(columns=KPI_MEASURE_LABELS)
+    energy_sums = (
+        energy_filtered[energy_filtered["Measure"] == "Direct on-farm energy consumption"]
+        .groupby(["Reference area", "Year"], observed=True)["Value"]
+        .sum()
+        .rename("Energy Use")
+    )
+
+    # Keep one row per selected (country, year) even when no data exists,
+    # matching the old loop: sums default to 0, means stay NaN.
+    full_index = pd.MultiIndex.from_product([countries, years], names=["Reference area", "Year"])
+    df_kpi = pd.concat([nutrient_means, measure_sums, energy_sums], axis=1).reindex(full_index)
+
+    sum_cols = list(KPI_MEASURE_LABELS.values()) + ["Energy Use"]
+    for col in sum_cols:
+        if col not in df_kpi.columns:
+            df_kpi[col] = 0.0
+    df_kpi[sum_cols] = df_kpi[sum_cols].fillna(0)
+
+    for col in KPI_NUTRIENT_LABELS.values():
+        if col not in df_kpi.columns:
+            df_kpi[col] = float("nan")
+
+    df_kpi = df_kpi.reset_index().rename(columns={"Reference area": "Country"})
+    return df_kpi[[
+        "Country", "Year",
+        "Nitrogen Surplus", "Phosphorus Surplus",
+        "GHG Emissions", "Energy Use", "Water Use", "Arable Land",
+    ]]
+
 
 def compare_countries_report():
+    # Deferred: plotly.express is slow to import and only needed here
+    import plotly.express as px
+
     st.subheader("🌍 Multi-Country Sustainability Comparison")
 
     # Load data
@@ -13,59 +73,43 @@ def compare_countries_report():
     water = load_table("water")
 
     # Select countries and year(s)
-    countries = sorted(agri["Reference area"].dropna().unique())
+    countries = column_options("agri", "Reference area")
     selected_countries = st.multiselect("🌐 Select Countries", countries, default=["France", "Germany"])
 
-    years = sorted(agri["Year"].dropna().unique())
+    years = column_options("agri", "Year")
     selected_years = st.multiselect("📅 Select Year(s)", years, default=[max(years)])
 
     if not selected_countries or not selected_years:
         st.warning("Please select at least one country and one year.")
         return
 
-    # Filter data
-    agri_filtered = agri[agri["Reference area"].isin(selected_countries) & agri["Year"].isin(selected_years)]
-    energy_filtered = energy[energy["Reference area"].isin(selected_countries) & energy["Year"].isin(selected_years)]
+    # Filter data (query fuses the two membership masks in one pass and
+    # uses numexpr when available, skipping the intermediate bool arrays)
+    agri_filtered = agri.query("`Reference area` in @selected_countries and Year in @selected_years")
+    energy_filtered = energy.query("`Reference area` in @selected_countries and Year in @selected_years")
 
     # KPI Section
     st.markdown("### 📊 Key Indicators by Country")
-    kpi_data = []
-    for country in selected_countries:
-        for year in selected_years:
-            agri_c = agri_filtered[(agri_filtered["Reference area"] == country) & (agri_filtered["Year"] == year)]
-            energy_c = energy_filtered[(energy_filtered["Reference area"] == country) & (energy_filtered["Year"] == year)]
-            
-            kpi_data.append({
-                "Country": country,
-                "Year": year,
-                "Nitrogen Surplus": agri_c[agri_c["Nutrients"] == "Nitrogen"]["Value"].mean(),
-                "Phosphorus Surplus": agri_c[agri_c["Nutrients"] == "Phosphorus"]["Value"].mean(),
-                "GHG Emissions": agri_c[agri_c["Measure"] == "Total greenhouse gas emissions"]["Value"].sum(),
-                "Energy Use": energy_c[energy_c["Measure"] == "Direct on-farm energy consumption"]["Value"].sum(),
-                "Water Use": agri_c[agri_c["Measure"] == "Agriculture freshwater abstraction"]["Value"].sum(),
-                "Arable Land": agri_c[agri_c["Measure"] == "Arable land"]["Value"].sum()
-            })
-
-    df_kpi = pd.DataFrame(kpi_data)
+    df_kpi = _kpi_frame(tuple(selected_countries), tuple(selected_years))
 
     # 👉 Sort by Year first, then Country
     df_kpi = df_kpi.sort_values(by=["Year", "Country"]).reset_index(drop=True)
 
-    # Format and display
-    st.dataframe(df_kpi.style.format({
-        "Nitrogen Surplus": "{:,.2f}",
-        "Phosphorus Surplus": "{:,.2f}",
-        "GHG Emissions": "{:,.0f}",
-        "Energy Use": "{:,.0f}",
-        "Water Use": "{:,.0f}",
-        "Arable Land": "{:,.0f}"
-    }), use_container_width=True)
+    # Format in the front end via column_config instead of a pandas
+    # Styler, which runs a Python formatter per cell and ships HTML.
+    st.dataframe(df_kpi, use_container_width=True, column_config={
+        "Nitrogen Surplus": st.column_config.NumberColumn(format="%.2f"),
+        "Phosphorus Surplus": st.column_config.NumberColumn(format="%.2f"),
+        "GHG Emissions": st.column_config.NumberColumn(format="%.0f"),
+        "Energy Use": st.column_config.NumberColumn(format="%.0f"),
+        "Water Use": st.column_config.NumberColumn(format="%.0f"),
+        "Arable Land": st.column_config.NumberColumn(format="%.0f")
+    })
 
     # 👇 Add download button here
-    csv = df_kpi.to_csv(index=False)
     st.download_button(
         label="⬇️ Download KPI Data as CSV",
-        data=csv,
+        data=csv_bytes(df_kpi),
         file_name="multi_country_kpi.csv",
         mime="text/csv"
     )
@@ -93,18 +137,23 @@ def compare_countries_report():
 
     source_col, value_filter = metric_map[trend_type]
 
-    # Filter and aggregate data
+    # Group once and pick the selected sub-frame by dict lookup instead of
+    # rescanning the filtered tables with a fresh boolean mask per rerun.
+    agri_by_measure = dict(list(agri_filtered.groupby("Measure", observed=True)))
+    agri_by_nutrient = dict(list(agri_filtered.groupby("Nutrients", observed=True)))
+    energy_by_measure = dict(list(energy_filtered.groupby("Measure", observed=True)))
+
     if source_col == "Nutrients":
-        df_trend = agri_filtered[agri_filtered[source_col] == value_filter]
-        df_plot = df_trend.groupby(["Year", "Reference area"])["Value"].mean().reset_index()
+        df_trend = agri_by_nutrient.get(value_filter, agri_filtered.iloc[0:0])
+        df_plot = df_trend.groupby(["Year", "Reference area"], observed=True)["Value"].mean().reset_index()
         unit = df_trend["Unit of measure"].dropna().unique()
     elif trend_type in ["Water Use", "Arable Land"]:
-        df_trend = agri_filtered[agri_filtered[source_col] == value_filter]
-        df_plot = df_trend.groupby(["Year", "Reference area"])["Value"].sum().reset_index()
+        df_trend = agri_by_measure.get(value_filter, agri_filtered.iloc[0:0])
+        df_plot = df_trend.groupby(["Year", "Reference area"], observed=True)["Value"].sum().reset_index()
         unit = df_trend["Unit of measure"].dropna().unique()
     else:
-        df_trend = energy_filtered[energy_filtered[source_col] == value_filter]
-        df_plot = df_trend.groupby(["Year", "Reference area"])["Value"].sum().reset_index()
+        df_trend = energy_by_measure.get(value_filter, energy_filtered.iloc[0:0])
+        df_plot = df_trend.groupby(["Year", "Reference area"], observed=True)["Value"].sum().reset_index()
         unit = df_trend["Unit of measure"].dropna().unique()
 
     # Title + caption
@@ -113,9 +162,10 @@ def compare_countries_report():
 
     # Plot
     fig = px.line(df_plot, x="Year", y="Value", color="Reference area",
-                title=f"{trend_type} Comparison Over Time", markers=True)
+                title=f"{trend_type} Comparison Over Time", markers=True,
+                render_mode="webgl")
 
     fig.update_layout(xaxis=dict(dtick=1))
-    st.plotly_chart(fig, use_container_width=True)
+    st.plotly_chart(fig, use_container_width=True, config={"displayModeBar": False, "responsive": True})
 
     
@@ -1,7 +1,131 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-from utils.db import load_table
+from utils.db import load_table, load_table_indexed, column_options
+from utils.export import csv_bytes
+
+
+def _country_year_slice(df_idx, country, year):
+    """Rows for one (country, year) from an indexed table; empty when absent."""
+    try:
+        return df_idx.loc[(country, year)]
+    except KeyError:
+        return df_idx.iloc[0:0]
+
+
+def _kpi_values(agri_by_nutrient, agri_by_measure, energy_by_measure, country, year):
+    """All six KPI card values for one (country, year) in three grouped passes.
+
+    Slices each indexed table once and aggregates per key, instead of a
+    separate filter per card. Sums default to 0 and means to NaN for
+    missing keys, matching the old per-card masks.
+    """
+    nutrient_means = (
+        _country_year_slice(agri_by_nutrient, country, year)
+        .groupby(level="Nutrients", observed=True)["Value"].mean()
+    )
+    measure_sums = (
+        _country_year_slice(agri_by_measure, country, year)
+        .groupby(level="Measure", observed=True)["Value"].sum()
+    )
+    energy_sums = (
+        _country_year_slice(energy_by_measure, country, year)
+        .groupby(level="Measure", observed=True)["Value"].sum()
+    )
+    return {
+        "Nitrogen Surplus": nutrient_means.get("Nitrogen", float("nan")),
+        "Phosphorus Surplus": nutrient_means.get("Phosphorus", float("nan")),
+        "GHG Emissions": measure_sums.get("Total greenhouse gas emissions", 0.0),
+        "Energy Use": energy_sums.get("Direct on-farm energy consumption", 0.0),
+        "Water Use": measure_sums.get("Agriculture freshwater abstraction", 0.0),
+        "Arable Land": measure_sums.get("Arable land", 0.0),
+    }
+
+
+@st.cache_data(max_entries=64)
+def _year_line_fig(df, title, y_label):
+    """Yearly line chart, memoized so identical selections skip the
+    Plotly figure construction entirely on reruns."""
+    import plotly.express as px
+
+    fig = px.line(df, x="Year", y="Value", title=title,
+                  labels={"Value": y_label}, markers=True, render_mode="webgl")
+    fig.update_layout(xaxis=dict(dtick=1))
+    return fig
+
+
+@st.fragment
+def _nutrient_section(agri_country):
+    st.subheader("🧪 Nutrient Surplus Analysis")
+    st.caption("Shows annual nutrient surplus (kg/ha) for selected nutrient type.")
+    nutrient_options = agri_country["Nutrients"].dropna().unique()
+    if nutrient_options.size > 0:
+        selected_nutrient = st.selectbox("Select Nutrient", sorted(nutrient_options), key="nutrient_select")
+        df_nutrient = agri_country[agri_country["Nutrients"] == selected_nutrient].groupby("Year")["Value"].mean().reset_index()
+        fig_nutrient = _year_line_fig(df_nutrient, f"{selected_nutrient} Surplus Over Time", "kg/ha")
+        st.plotly_chart(fig_nutrient, use_container_width=True, config={"displayModeBar": False, "responsive": True})
+    else:
+        st.info("No nutrient data available.")
+
+
+@st.fragment
+def _emissions_section(agri_country):
+    st.subheader("🌫️ GHG Emissions Analysis")
+    st.caption("Tracks greenhouse gas emissions from agriculture.")
+    # Tag the handful of unique measures vectorized instead of lowercasing
+    # every name in a Python list-comp on each rerun.
+    gas_options = pd.Index(agri_country["Measure"].dropna().unique())
+    gas_choices = gas_options[gas_options.str.contains("emission", case=False)].tolist()
+    if gas_choices:
+        selected_gas = st.selectbox("Select Gas Type", sorted(gas_choices), key="gas_select")
+        df_gas = agri_country[agri_country["Measure"] == selected_gas].groupby("Year")["Value"].sum().reset_index()
+        fig_gas = _year_line_fig(df_gas, f"{selected_gas} Over Time", "Emissions (tonnes)")
+        st.plotly_chart(fig_gas, use_container_width=True, config={"displayModeBar": False, "responsive": True})
+    else:
+        st.info("No GHG emission data available.")
+
+
+@st.fragment
+def _energy_section(energy_country):
+    st.subheader("⚡ Energy Use Analysis")
+    st.caption("Shows energy consumption over time in tonnes of oil equivalent.")
+    energy_measures = energy_country["Measure"].dropna().unique()
+    if energy_measures.size > 0:
+        selected_energy = st.selectbox("Select Energy Measure", sorted(energy_measures), key="energy_select")
+        df_energy = energy_country[energy_country["Measure"] == selected_energy].groupby("Year")["Value"].sum().reset_index()
+        fig_energy = _year_line_fig(df_energy, f"{selected_energy} Over Time", "TOE")
+        st.plotly_chart(fig_energy, use_container_width=True, config={"displayModeBar": False, "responsive": True})
+    else:
+        st.info("No energy data available.")
+
+
+@st.fragment
+def _water_section(agri_country):
+    st.subheader("💧 Water Use Analysis")
+    st.caption("Analyzes abstraction and irrigation metrics.")
+    water_measures = pd.Index(agri_country["Measure"].dropna().unique())
+    water_options = water_measures[water_measures.str.contains("water|irrigation", case=False)].tolist()
+    if water_options:
+        selected_water = st.selectbox("Select Water Measure", sorted(water_options), key="water_select")
+        df_water = agri_country[agri_country["Measure"] == selected_water].groupby("Year")["Value"].sum().reset_index()
+        fig_water = _year_line_fig(df_water, f"{selected_water} Over Time", "m³ / ha")
+        st.plotly_chart(fig_water, use_container_width=True, config={"displayModeBar": False, "responsive": True})
+    else:
+        st.info("No water-related data available.")
+
+
+@st.fragment
+def _land_section(agri_country):
+    st.subheader("🌾 Land Use Analysis")
+    st.caption("Tracks agricultural land use types over time.")
+    land_options = agri_country.loc[agri_country["Unit of measure"] == "Hectares", "Measure"].dropna().unique()
+    if land_options.size > 0:
+        selected_land = st.selectbox("Select Land Use Type", sorted(land_options), key="land_select")
+        df_land = agri_country[agri_country["Measure"] == selected_land].groupby("Year")["Value"].sum().reset_index()
+        fig_land = _year_line_fig(df_land, f"{selected_land} Over Time", "Hectares")
+        st.plotly_chart(fig_land, use_container_width=True, config={"displayModeBar": False, "responsive": True})
+    else:
+        st.info("No land use data available.")
+
 
 def single_country_report():
     st.subheader("📌 Single Country Sustainability Report")
@@ -13,21 +137,22 @@ def single_country_report():
     water = load_table("water")
 
     # Select country and year(s)
-    countries = sorted(agri["Reference area"].dropna().unique())
+    countries = column_options("agri", "Reference area")
     selected_country = st.selectbox("🌍 Select Country", countries)
 
-    years = sorted(agri["Year"].dropna().unique())
+    years = column_options("agri", "Year")
     selected_years = st.multiselect("📅 Select Year(s)", years, default=[max(years)])
 
     if not selected_years:
         st.warning("Please select at least one year.")
         return
 
-    # Filter base data by country and year
-    agri_country = agri[(agri["Reference area"] == selected_country) & (agri["Year"].isin(selected_years))]
-    area_country = area[(area["Reference area"] == selected_country) & (area["Year"].isin(selected_years))]
-    energy_country = energy[(energy["Reference area"] == selected_country) & (energy["Year"].isin(selected_years))]
-    water_country = water[(water["Reference area"] == selected_country) & (water["Year"].isin(selected_years))]
+    # Filter base data by country and year in one fused query pass each
+    country_year = "`Reference area` == @selected_country and Year in @selected_years"
+    agri_country = agri.query(country_year)
+    area_country = area.query(country_year)
+    energy_country = energy.query(country_year)
+    water_country = water.query(country_year)
 
     # CSS for card styling and hover effects
     st.markdown("""
@@ -88,122 +213,56 @@ def single_country_report():
             </div>
         ''', unsafe_allow_html=True)
 
+    # Pre-indexed tables turn every KPI lookup into a sorted-index seek
+    # instead of a pair of full-column boolean masks.
+    agri_by_nutrient = load_table_indexed("agri", ("Reference area", "Year", "Nutrients"))
+    agri_by_measure = load_table_indexed("agri")
+    energy_by_measure = load_table_indexed("energy")
+
+    kpi_now = _kpi_values(agri_by_nutrient, agri_by_measure, energy_by_measure,
+                          selected_country, latest_year)
+    kpi_prev = _kpi_values(agri_by_nutrient, agri_by_measure, energy_by_measure,
+                           selected_country, previous_year) if previous_year else None
+
+    def _prev(label):
+        return kpi_prev[label] if kpi_prev else None
+
     st.markdown(f"### 📊 Key Indicators – {selected_country} in {latest_year}")
     with st.container():
         col1, col2, col3 = st.columns(3)
         with col1:
-            n_now = agri_country[(agri_country["Nutrients"] == "Nitrogen") & (agri_country["Year"] == latest_year)]["Value"].mean()
-            n_prev = agri_country[(agri_country["Nutrients"] == "Nitrogen") & (agri_country["Year"] == previous_year)]["Value"].mean() if previous_year else None
-            render_card("Nitrogen Surplus", n_now, n_prev, "kg/ha", "🧪")
+            render_card("Nitrogen Surplus", kpi_now["Nitrogen Surplus"], _prev("Nitrogen Surplus"), "kg/ha", "🧪")
         with col2:
-            p_now = agri_country[(agri_country["Nutrients"] == "Phosphorus") & (agri_country["Year"] == latest_year)]["Value"].mean()
-            p_prev = agri_country[(agri_country["Nutrients"] == "Phosphorus") & (agri_country["Year"] == previous_year)]["Value"].mean() if previous_year else None
-            render_card("Phosphorus Surplus", p_now, p_prev, "kg/ha", "🧪")
+            render_card("Phosphorus Surplus", kpi_now["Phosphorus Surplus"], _prev("Phosphorus Surplus"), "kg/ha", "🧪")
         with col3:
-            ghg_now = agri_country[(agri_country["Measure"] == "Total greenhouse gas emissions") & (agri_country["Year"] == latest_year)]["Value"].sum()
-            ghg_prev = agri_country[(agri_country["Measure"] == "Total greenhouse gas emissions") & (agri_country["Year"] == previous_year)]["Value"].sum() if previous_year else None
-            render_card("GHG Emissions", ghg_now, ghg_prev, "tonnes", "🌫️")
+            render_card("GHG Emissions", kpi_now["GHG Emissions"], _prev("GHG Emissions"), "tonnes", "🌫️")
 
         col4, col5, col6 = st.columns(3)
         with col4:
-            en_now = energy_country[(energy_country["Measure"] == "Direct on-farm energy consumption") & (energy_country["Year"] == latest_year)]["Value"].sum()
-            en_prev = energy_country[(energy_country["Measure"] == "Direct on-farm energy consumption") & (energy_country["Year"] == previous_year)]["Value"].sum() if previous_year else None
-            render_card("Energy Use", en_now, en_prev, "TOE", "⚡")
+            render_card("Energy Use", kpi_now["Energy Use"], _prev("Energy Use"), "TOE", "⚡")
         with col5:
-            water_now = agri_country[(agri_country["Measure"] == "Agriculture freshwater abstraction") & (agri_country["Year"] == latest_year)]["Value"].sum()
-            water_prev = agri_country[(agri_country["Measure"] == "Agriculture freshwater abstraction") & (agri_country["Year"] == previous_year)]["Value"].sum() if previous_year else None
-            render_card("Water Use", water_now, water_prev, "m³", "💧")
+            render_card("Water Use", kpi_now["Water Use"], _prev("Water Use"), "m³", "💧")
         with col6:
-            arable_now = agri_country[(agri_country["Measure"] == "Arable land") & (agri_country["Year"] == latest_year)]["Value"].sum()
-            arable_prev = agri_country[(agri_country["Measure"] == "Arable land") & (agri_country["Year"] == previous_year)]["Value"].sum() if previous_year else None
-            render_card("Arable Land", arable_now, arable_prev, "ha", "🌾")
-
-    # ---------------------------------------------------
-    # 2. Environment Section
-    # ---------------------------------------------------
-    st.markdown("---")
-    st.subheader("🧪 Nutrient Surplus Analysis")
-    st.caption("Shows annual nutrient surplus (kg/ha) for selected nutrient type.")
-    nutrient_options = agri_country["Nutrients"].dropna().unique()
-    if nutrient_options.size > 0:
-        selected_nutrient = st.selectbox("Select Nutrient", sorted(nutrient_options), key="nutrient_select")
-        df_nutrient = agri_country[agri_country["Nutrients"] == selected_nutrient].groupby("Year")["Value"].mean().reset_index()
-        fig_nutrient = px.line(df_nutrient, x="Year", y="Value", title=f"{selected_nutrient} Surplus Over Time",
-                               labels={"Value": "kg/ha"}, markers=True)
-        fig_nutrient.update_layout(xaxis=dict(dtick=1))
-        st.plotly_chart(fig_nutrient, use_container_width=True)
-    else:
-        st.info("No nutrient data available.")
-
-    # ---------------------------------------------------
-    # 3. Emissions Section
-    # ---------------------------------------------------
-    st.markdown("---")
-    st.subheader("🌫️ GHG Emissions Analysis")
-    st.caption("Tracks greenhouse gas emissions from agriculture.")
-    gas_options = agri_country["Measure"].dropna().unique()
-    gas_choices = [g for g in gas_options if "emission" in g.lower()]
-    if gas_choices:
-        selected_gas = st.selectbox("Select Gas Type", sorted(gas_choices), key="gas_select")
-        df_gas = agri_country[agri_country["Measure"] == selected_gas].groupby("Year")["Value"].sum().reset_index()
-        fig_gas = px.line(df_gas, x="Year", y="Value", title=f"{selected_gas} Over Time",
-                          labels={"Value": "Emissions (tonnes)"}, markers=True)
-        fig_gas.update_layout(xaxis=dict(dtick=1))
-        st.plotly_chart(fig_gas, use_container_width=True)
-    else:
-        st.info("No GHG emission data available.")
-
-    # ---------------------------------------------------
-    # 4. Energy Section
-    # ---------------------------------------------------
-    st.markdown("---")
-    st.subheader("⚡ Energy Use Analysis")
-    st.caption("Shows energy consumption over time in tonnes of oil equivalent.")
-    energy_measures = energy_country["Measure"].dropna().unique()
-    if energy_measures.size > 0:
-        selected_energy = st.selectbox("Select Energy Measure", sorted(energy_measures), key="energy_select")
-        df_energy = energy_country[energy_country["Measure"] == selected_energy].groupby("Year")["Value"].sum().reset_index()
-        fig_energy = px.line(df_energy, x="Year", y="Value", title=f"{selected_energy} Over Time",
-                             labels={"Value": "TOE"}, markers=True)
-        fig_energy.update_layout(xaxis=dict(dtick=1))
-        st.plotly_chart(fig_energy, use_container_width=True)
-    else:
-        st.info("No energy data available.")
+            render_card("Arable Land", kpi_now["Arable Land"], _prev("Arable Land"), "ha", "🌾")
 
     # ---------------------------------------------------
-    # 5. Water Section
+    # 2-6. Per-topic analyses in tabs (fragments: each
+    # selectbox only reruns its own subsection)
     # ---------------------------------------------------
     st.markdown("---")
-    st.subheader("💧 Water Use Analysis")
-    st.caption("Analyzes abstraction and irrigation metrics.")
-    water_measures = agri_country["Measure"].dropna().unique()
-    water_options = [m for m in water_measures if "water" in m.lower() or "irrigation" in m.lower()]
-    if water_options:
-        selected_water = st.selectbox("Select Water Measure", sorted(water_options), key="water_select")
-        df_water = agri_country[agri_country["Measure"] == selected_water].groupby("Year")["Value"].sum().reset_index()
-        fig_water = px.line(df_water, x="Year", y="Value", title=f"{selected_water} Over Time",
-                            labels={"Value": "m³ / ha"}, markers=True)
-        fig_water.update_layout(xaxis=dict(dtick=1))
-        st.plotly_chart(fig_water, use_container_width=True)
-    else:
-        st.info("No water-related data available.")
-
-    # ---------------------------------------------------
-    # 6. Land Use Section
-    # ---------------------------------------------------
-    st.markdown("---")
-    st.subheader("🌾 Land Use Analysis")
-    st.caption("Tracks agricultural land use types over time.")
-    land_options = agri_country[agri_country["Unit of measure"].str.contains("Hectares", na=False)]["Measure"].dropna().unique()
-    if land_options.size > 0:
-        selected_land = st.selectbox("Select Land Use Type", sorted(land_options), key="land_select")
-        df_land = agri_country[agri_country["Measure"] == selected_land].groupby("Year")["Value"].sum().reset_index()
-        fig_land = px.line(df_land, x="Year", y="Value", title=f"{selected_land} Over Time",
-                           labels={"Value": "Hectares"}, markers=True)
-        fig_land.update_layout(xaxis=dict(dtick=1))
-        st.plotly_chart(fig_land, use_container_width=True)
-    else:
-        st.info("No land use data available.")
+    tab_nutrients, tab_ghg, tab_energy, tab_water, tab_land = st.tabs([
+        "🧪 Nutrients", "🌫️ GHG", "⚡ Energy", "💧 Water", "🌾 Land"
+    ])
+    with tab_nutrients:
+        _nutrient_section(agri_country)
+    with tab_ghg:
+        _emissions_section(agri_country)
+    with tab_energy:
+        _energy_section(energy_country)
+    with tab_water:
+        _water_section(agri_country)
+    with tab_land:
+        _land_section(agri_country)
 
     # ---------------------------------------------------
     # Download Button
@@ -211,7 +270,7 @@ def single_country_report():
     st.markdown("---")
     st.download_button(
         label="⬇️ Download This Country's Data as CSV",
-        data=agri_country.to_csv(index=False),
+        data=csv_bytes(agri_country),
         file_name=f"{selected_country}_report.csv",
         mime="text/csv"
     )
@@ -1,9 +1,10 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
 from utils.db import load_table
 
 def section_area():
+    # Deferred: plotly.express is slow to import and only needed here
+    import plotly.express as px
+
     st.header("🌾 Land Use in Agriculture")
 
     agri = load_table("agri")
@@ -20,9 +21,11 @@ def section_area():
         "Arable land", "Permanent pasture", "Permanent crops",
         "Organic farming", "Total agricultural land area"
     ]
+    # The keywords are full measure names, so a hash-based isin beats
+    # regex-scanning every row with str.contains on each rerun.
     df_land = agri[
-        agri["Measure"].str.contains("|".join(land_keywords), case=False, na=False) &
-        agri["Unit of measure"].str.contains("Hectares", na=False) &
+        agri["Measure"].isin(land_keywords) &
+        (agri["Unit of measure"] == "Hectares") &
         (agri["Year"] >= 2012)
     ]
 
@@ -45,22 +48,23 @@ def section_area():
     fig_global = px.line(
         df_global, x="Year", y="Value", markers=True,
         title=f"Global Area of {selected_type} (2012+)",
-        labels={"Value": "Area (hectares)"}
+        labels={"Value": "Area (hectares)"},
+        render_mode="webgl"
     )
-    st.plotly_chart(fig_global)
+    st.plotly_chart(fig_global, config={"displayModeBar": False, "responsive": True})
 
     # ----------------------------------------
     # Top countries by land area
     # ----------------------------------------
     st.subheader(f"🏆 Top Countries by {selected_type} (avg since 2012)")
-    df_top = df_selected.groupby("Reference area")["Value"].mean().nlargest(10).reset_index()
+    df_top = df_selected.groupby("Reference area", observed=True)["Value"].mean().nlargest(10).reset_index()
     fig_top = px.bar(
         df_top, x="Reference area", y="Value",
         color="Value", color_continuous_scale="Greens",
         labels={"Value": "Avg Area (ha)"},
         title=f"Top 10 Countries with Most {selected_type}"
     )
-    st.plotly_chart(fig_top)
+    st.plotly_chart(fig_top, config={"displayModeBar": False, "responsive": True})
 
     # ----------------------------------------
     
@@ -76,9 +80,10 @@ def section_area():
         fig_country = px.line(
             df_country_year, x="Year", y="Value", markers=True,
             title=f"{selected_country} - {selected_type} Over Time",
-            labels={"Value": "Area (hectares)"}
+            labels={"Value": "Area (hectares)"},
+            render_mode="webgl"
         )
-        st.plotly_chart(fig_country)
+        st.plotly_chart(fig_country, config={"displayModeBar": False, "responsive": True})
 
     # ----------------------------------------
     # Choropleth Map - separated section
@@ -89,7 +94,7 @@ def section_area():
     year_map = st.selectbox("Select Year", available_years, key="land_map_year")
 
     df_map = df_selected[df_selected["Year"] == year_map]
-    df_map_grouped = df_map.groupby("Reference area")["Value"].mean().reset_index()
+    df_map_grouped = df_map.groupby("Reference area", observed=True)["Value"].mean().reset_index()
 
     fig_map = px.choropleth(
         df_map_grouped, locations="Reference area", locationmode="country names",
@@ -98,7 +103,7 @@ def section_area():
         labels={"Value": "Area (hectares)"},
         title=f"{selected_type} by Country in {year_map}"
     )
-    st.plotly_chart(fig_map)
+    st.plotly_chart(fig_map, config={"displayModeBar": False, "responsive": True})
 
     # ----------------------------------------
     # Download option
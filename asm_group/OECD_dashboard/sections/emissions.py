@@ -1,13 +1,147 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import numpy as np
 from utils.db import load_table
+from utils.rank import top_k
 
-def section_emissions():
-    st.header("🌍 Emissions & Chemical Use in Agriculture")
+GHG_KEYWORDS = ['Total greenhouse gas emissions', 'Methane', 'Nitrous oxide', 'Carbone dioxide']
+PEST_KEYWORDS = ['Sales of insecticides', 'Sales of fungicides', 'Sales of herbicides', 'Total sales of agricultural pesticides']
+
+
+def _pruned(df, cols=("Measure", "Reference area")):
+    """Drop category labels the filter removed, so .cat.categories lists
+    exactly the values present and selectboxes can skip unique()+sort."""
+    return df.assign(**{c: df[c].cat.remove_unused_categories() for c in cols})
+
+
+def _matching_categories(series, pattern, case=True):
+    """Category labels of a categorical column matching a pattern.
+
+    The substring scan runs over the few dozen unique labels, so the
+    per-row filter can be a plain isin over integer codes.
+    """
+    cats = series.cat.categories
+    return cats[cats.str.contains(pattern, case=case, na=False)]
 
+
+@st.cache_data(ttl=3600)
+def _ghg_frame():
+    """GHG emission rows (tonnes) of the agri table, filtered once per session."""
     agri = load_table("agri")
+    ghg_measures = _matching_categories(agri['Measure'], '|'.join(GHG_KEYWORDS), case=False)
+    tonnes_units = _matching_categories(agri['Unit of measure'], "Tonnes")
+    df = agri[
+        agri['Measure'].isin(ghg_measures) &
+        agri['Unit of measure'].isin(tonnes_units)
+    ]
+    return _pruned(df)
+
+
+@st.cache_data(ttl=3600)
+def _nh3_frame():
+    """Ammonia emission rows (tonnes, 2012+), filtered once per session."""
+    agri = load_table("agri")
+    nh3_measures = _matching_categories(agri["Measure"], "Ammonia", case=False)
+    tonnes_units = _matching_categories(agri["Unit of measure"], "Tonnes")
+    df = agri[
+        agri["Measure"].isin(nh3_measures) &
+        agri["Unit of measure"].isin(tonnes_units) &
+        (agri["Year"] >= 2012)
+    ]
+    return _pruned(df)
+
+
+@st.cache_data(ttl=3600)
+def _pest_frame():
+    """Pesticide sales rows (tonnes, 2012+), filtered once per session."""
+    agri = load_table("agri")
+    tonnes_units = _matching_categories(agri['Unit of measure'], "Tonnes")
+    df = agri[
+        agri['Measure'].isin(PEST_KEYWORDS) &
+        agri['Unit of measure'].isin(tonnes_units) &
+        (agri["Year"] >= 2012)
+    ]
+    return _pruned(df)
+
+
+_FRAMES = {"ghg": _ghg_frame, "nh3": _nh3_frame, "pest": _pest_frame}
+
+
+@st.cache_data(ttl=3600, max_entries=8)
+def _measure_indexed(frame):
+    """Emission rows keyed by (Measure, Reference area) and sorted.
+
+    .loc on the sorted index is a binary-search seek rather than the
+    full-column boolean scan a mask filter pays per selection.
+    """
+    return _FRAMES[frame]().set_index(["Measure", "Reference area"]).sort_index()
+
+
+def _measure_slice(frame, measure, country=None):
+    """Rows for one measure (optionally one country) via an index seek.
+
+    List-style .loc keys always return a DataFrame; a missing key means
+    an empty selection, mirroring what the old mask filters produced.
+    """
+    df_idx = _measure_indexed(frame)
+    try:
+        if country is not None:
+            return df_idx.loc[[(measure, country)]]
+        return df_idx.loc[[measure]]
+    except KeyError:
+        return df_idx.iloc[0:0]
+
+
+@st.cache_data(ttl=3600, max_entries=64)
+def _yearly_sum(frame, measure=None, country=None):
+    """Per-year totals for one widget selection.
+
+    Keyed on plain strings so the cache hash is O(1); the rows come from
+    the already-cached frame helpers, so changing a selectbox serves a
+    pre-reduced ~40-row result instead of rescanning the parent table.
+    """
+    if measure is not None:
+        df = _measure_slice(frame, measure, country)
+    elif country is not None:
+        df = _measure_indexed(frame).xs(country, level="Reference area", drop_level=False)
+    else:
+        df = _FRAMES[frame]()
+    # Returned as a Series: px can plot index/values directly, so there
+    # is no reset_index copy per chart
+    return df.groupby("Year")["Value"].sum()
+
+
+@st.cache_data(ttl=3600, max_entries=32)
+def _country_mean(frame, measure=None):
+    """Per-country mean values for one widget selection."""
+    df = _measure_slice(frame, measure) if measure is not None else _FRAMES[frame]()
+    return df.groupby("Reference area", observed=True)["Value"].mean()
+
+
+@st.cache_data(ttl=3600, max_entries=64)
+def _country_options(frame, measure):
+    """Sorted country labels present for one measure, memoized per selection."""
+    countries = _measure_slice(frame, measure).index.get_level_values("Reference area")
+    return tuple(countries.remove_unused_categories().categories)
+
+
+@st.cache_data(ttl=3600)
+def _ghg_country_means():
+    """Average emissions per (country, gas) since 2012."""
+    df = _ghg_frame()
+    return (
+        df[df["Year"] >= 2012]
+        .groupby(["Reference area", "Measure"], observed=True)["Value"]
+        .mean()
+        .reset_index()
+    )
+
+
+def section_emissions():
+    # Deferred: plotly.express is slow to import and only needed here
+    import plotly.express as px
+
+    st.header("🌍 Emissions & Chemical Use in Agriculture")
 
     st.markdown("""
     Agriculture contributes significantly to **greenhouse gas (GHG) emissions**, **ammonia (NH₃)** release, and **pesticide usage**.  
@@ -23,38 +157,35 @@ def section_emissions():
     High emissions are linked to intensive farming, livestock, and fertilizer use.
     """)
 
-    ghg_keywords = ['Total greenhouse gas emissions', 'Methane', 'Nitrous oxide', 'Carbone dioxide']
-    df_ghg = agri[
-        agri['Measure'].str.contains('|'.join(ghg_keywords), case=False, na=False) &
-        (agri['Unit of measure'].str.contains("Tonnes", na=False))
-    ]
+    df_ghg = _ghg_frame()
 
     if df_ghg.empty:
         st.warning("No GHG emission data found in this dataset.")
     else:
-        gases = df_ghg['Measure'].dropna().unique()
-        selected_gas = st.selectbox("🌫️ Select Greenhouse Gas", sorted(gases))
+        selected_gas = st.selectbox("🌫️ Select Greenhouse Gas", df_ghg['Measure'].cat.categories.tolist())
 
-        df_gas = df_ghg[df_ghg['Measure'] == selected_gas]
-        df_gas_avg = df_gas.groupby("Year")["Value"].sum().reset_index()
+        s_gas = _yearly_sum("ghg", measure=selected_gas)
 
         fig_ghg = px.line(
-            df_gas_avg, x="Year", y="Value", markers=True,
+            x=s_gas.index, y=s_gas.values, markers=True, render_mode="webgl",
             title=f"{selected_gas} from Agriculture (Total across countries)",
-            labels={"Value": "Emissions (tonnes)"}
+            labels={"x": "Year", "y": "Emissions (tonnes)"}
         )
         st.plotly_chart(fig_ghg)
 
         with st.expander("🔍 View by Country"):
-            country_list_ghg = sorted(df_gas["Reference area"].dropna().unique())
-            selected_country_ghg = st.selectbox("Select Country", country_list_ghg, key="ghg-country")
-            df_gas_country = df_gas[df_gas["Reference area"] == selected_country_ghg]
-            df_gas_country_yearly = df_gas_country.groupby("Year")["Value"].sum().reset_index()
+            country_list_ghg = _country_options("ghg", selected_gas)
+            selected_country_ghg = st.selectbox("Select Country", country_list_ghg, key="ghg-country",
+                                                disabled=len(country_list_ghg) == 0)
+            s_gas_country = _yearly_sum("ghg", measure=selected_gas, country=selected_country_ghg)
 
-            fig_country = px.line(df_gas_country_yearly, x="Year", y="Value", markers=True,
-                                  title=f"{selected_gas} Emissions: {selected_country_ghg}",
-                                  labels={"Value": "Emissions (tonnes)"})
-            st.plotly_chart(fig_country)
+            # Figure construction is dozens of dict allocations; skip it
+            # outright for an empty selection
+            if s_gas_country.shape[0]:
+                fig_country = px.line(x=s_gas_country.index, y=s_gas_country.values, markers=True, render_mode="webgl",
+                                      title=f"{selected_gas} Emissions: {selected_country_ghg}",
+                                      labels={"x": "Year", "y": "Emissions (tonnes)"})
+                st.plotly_chart(fig_country)
 
     # ------------------------
     # 2. Country Comparison
@@ -62,14 +193,9 @@ def section_emissions():
     st.subheader("🌐 GHG Emissions by Country")
     st.markdown("Average GHG emissions from agriculture per country since 2012.")
 
-    df_ghg_recent = df_ghg[df_ghg["Year"] >= 2012]
-    df_country_ghg = (
-        df_ghg_recent.groupby(["Reference area", "Measure"])["Value"]
-        .mean()
-        .reset_index()
-    )
+    df_country_ghg = _ghg_country_means()
 
-    selected_gas_bar = st.selectbox("📦 Select Gas for Comparison", sorted(df_country_ghg["Measure"].unique()))
+    selected_gas_bar = st.selectbox("📦 Select Gas for Comparison", df_country_ghg["Measure"].cat.categories.tolist())
 
     df_bar = df_country_ghg[df_country_ghg["Measure"] == selected_gas_bar].sort_values("Value", ascending=False).head(15)
 
@@ -90,36 +216,30 @@ def section_emissions():
     st.subheader("💨 Ammonia (NH₃) Emissions from Agriculture")
     st.markdown("Ammonia emissions contribute to air pollution and eutrophication. Major sources: livestock manure & fertilizer volatilization.")
 
-    df_nh3 = agri[
-        agri["Measure"].str.contains("Ammonia", case=False, na=False) &
-        (agri["Unit of measure"].str.contains("Tonnes", na=False)) &
-        (agri["Year"] >= 2012)
-    ]
+    df_nh3 = _nh3_frame()
 
     if df_nh3.empty:
         st.warning("No Ammonia emission data found.")
     else:
-        df_nh3_country = df_nh3.groupby("Reference area")["Value"].mean().nlargest(10).reset_index()
+        s_nh3 = top_k(_country_mean("nh3"), 10)
         fig_nh3 = px.bar(
-            df_nh3_country,
-            x="Reference area",
-            y="Value",
-            color="Value",
+            x=s_nh3.index, y=s_nh3.values, color=s_nh3.values,
             color_continuous_scale="Plasma",
-            labels={"Value": "Average NH₃ Emissions (tonnes)", "Reference area": "Country"},
+            labels={"x": "Country", "y": "Average NH₃ Emissions (tonnes)", "color": "Average NH₃ Emissions (tonnes)"},
             title="Top 10 NH₃ Emitting Countries (since 2012)"
         )
         st.plotly_chart(fig_nh3)
 
         with st.expander("🔍 View by Country"):
-            country_list_nh3 = sorted(df_nh3["Reference area"].dropna().unique())
-            selected_country_nh3 = st.selectbox("Select Country", country_list_nh3, key="nh3-country")
-            df_nh3_country_detail = df_nh3[df_nh3["Reference area"] == selected_country_nh3]
-            df_nh3_yearly = df_nh3_country_detail.groupby("Year")["Value"].sum().reset_index()
-            fig_nh3_country = px.line(df_nh3_yearly, x="Year", y="Value", markers=True,
-                                       labels={"Value": "NH₃ Emissions (tonnes)"},
-                                       title=f"{selected_country_nh3}: NH₃ Emissions Over Time")
-            st.plotly_chart(fig_nh3_country)
+            country_list_nh3 = df_nh3["Reference area"].cat.categories.tolist()
+            selected_country_nh3 = st.selectbox("Select Country", country_list_nh3, key="nh3-country",
+                                                disabled=len(country_list_nh3) == 0)
+            s_nh3_yearly = _yearly_sum("nh3", country=selected_country_nh3)
+            if s_nh3_yearly.shape[0]:
+                fig_nh3_country = px.line(x=s_nh3_yearly.index, y=s_nh3_yearly.values, markers=True, render_mode="webgl",
+                                           labels={"x": "Year", "y": "NH₃ Emissions (tonnes)"},
+                                           title=f"{selected_country_nh3}: NH₃ Emissions Over Time")
+                st.plotly_chart(fig_nh3_country)
 
     # ------------------------
     # 4. Pesticide Usage
@@ -127,40 +247,33 @@ def section_emissions():
     st.subheader("🧪 Agricultural Pesticide Usage")
     st.markdown("Pesticides impact biodiversity and human health. Tracking their sales helps monitor chemical input intensity.")
 
-    pest_keywords = ['Sales of insecticides', 'Sales of fungicides', 'Sales of herbicides', 'Total sales of agricultural pesticides']
-    df_pest = agri[
-        agri['Measure'].isin(pest_keywords) &
-        (agri['Unit of measure'].str.contains("Tonnes", na=False)) &
-        (agri["Year"] >= 2012)
-    ]
+    df_pest = _pest_frame()
 
     if df_pest.empty:
         st.warning("No pesticide sales data found.")
     else:
-        selected_pesticide = st.selectbox("🧴 Select Pesticide Type", sorted(df_pest["Measure"].unique()))
+        selected_pesticide = st.selectbox("🧴 Select Pesticide Type", df_pest["Measure"].cat.categories.tolist())
         df_pest_type = df_pest[df_pest["Measure"] == selected_pesticide]
-        df_pest_avg = df_pest_type.groupby("Reference area")["Value"].mean().nlargest(10).reset_index()
+        s_pest = top_k(_country_mean("pest", measure=selected_pesticide), 10)
 
         fig_pest = px.bar(
-            df_pest_avg,
-            x="Reference area",
-            y="Value",
-            color="Value",
+            x=s_pest.index, y=s_pest.values, color=s_pest.values,
             color_continuous_scale="Oranges",
-            labels={"Value": "Avg Sales (tonnes)", "Reference area": "Country"},
+            labels={"x": "Country", "y": "Avg Sales (tonnes)", "color": "Avg Sales (tonnes)"},
             title=f"Top 10 Countries by {selected_pesticide}"
         )
         st.plotly_chart(fig_pest)
 
         with st.expander("🔍 View by Country"):
-            country_list_pest = sorted(df_pest_type["Reference area"].dropna().unique())
-            selected_country_pest = st.selectbox("Select Country", country_list_pest, key="pest-country")
-            df_pest_country = df_pest_type[df_pest_type["Reference area"] == selected_country_pest]
-            df_pest_yearly = df_pest_country.groupby("Year")["Value"].sum().reset_index()
-            fig_pest_country = px.line(df_pest_yearly, x="Year", y="Value", markers=True,
-                                       labels={"Value": f"{selected_pesticide} (tonnes)"},
-                                       title=f"{selected_country_pest}: {selected_pesticide} Usage Over Time")
-            st.plotly_chart(fig_pest_country)
+            country_list_pest = _country_options("pest", selected_pesticide)
+            selected_country_pest = st.selectbox("Select Country", country_list_pest, key="pest-country",
+                                                 disabled=len(country_list_pest) == 0)
+            s_pest_yearly = _yearly_sum("pest", measure=selected_pesticide, country=selected_country_pest)
+            if s_pest_yearly.shape[0]:
+                fig_pest_country = px.line(x=s_pest_yearly.index, y=s_pest_yearly.values, markers=True, render_mode="webgl",
+                                           labels={"x": "Year", "y": f"{selected_pesticide} (tonnes)"},
+                                           title=f"{selected_country_pest}: {selected_pesticide} Usage Over Time")
+                st.plotly_chart(fig_pest_country)
 
     # ------------------------
     # 5. Insight
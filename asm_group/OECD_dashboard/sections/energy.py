@@ -1,84 +1,122 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import numpy as np
 from utils.db import load_table
+from utils.rank import top_k
 
-def section_energy():
-    st.header("⚡ Energy Use in Agriculture")
+ENERGY_MEASURES = [
+    "Direct on-farm energy consumption",
+    "Total final energy consumption"
+]
 
-    energy = load_table("energy")
-
-    st.markdown("""
-    Energy consumption in agriculture reflects production intensity, mechanization levels, and sustainability of food systems.  
-    This section explores **Direct On-Farm Energy Use** and **Total Final Energy Consumption**, with global and national insights.
-    """)
 
-    # Filter and select relevant measures
-    energy_measures = [
-        "Direct on-farm energy consumption",
-        "Total final energy consumption"
-    ]
-    df_energy = energy[
-        energy["Measure"].isin(energy_measures) &
+@st.cache_data(ttl=3600)
+def _energy_frame():
+    """Relevant energy measures (2000+), filtered once per session."""
+    energy = load_table("energy")
+    df = energy[
+        energy["Measure"].isin(ENERGY_MEASURES) &
         (energy["Year"] >= 2000)
     ]
+    # Drop labels filtered out above so .cat.categories lists exactly the
+    # values present and selectboxes can skip unique()+sort
+    return df.assign(**{
+        c: df[c].cat.remove_unused_categories()
+        for c in ("Measure", "Reference area")
+    })
 
-    if df_energy.empty:
-        st.warning("No energy-related data found.")
-        return
 
-    # Select energy measure
-    selected_measure = st.selectbox("🔋 Select Energy Measure", sorted(df_energy["Measure"].unique()))
-    df_selected = df_energy[df_energy["Measure"] == selected_measure]
+@st.cache_data(ttl=3600, max_entries=64)
+def _measure_yearly_sum(measure, country=None):
+    """Per-year totals for one measure (optionally one country).
+
+    String-keyed so a selectbox change is a cache lookup over a small
+    pre-reduced frame rather than a rescan of the full energy table.
+    """
+    df = _energy_frame()
+    df = df[df["Measure"] == measure]
+    if country is not None:
+        df = df[df["Reference area"] == country]
+    # Returned as a Series: px can plot index/values directly, so there
+    # is no reset_index copy per chart
+    return df.groupby("Year")["Value"].sum()
+
+
+@st.cache_data(ttl=3600, max_entries=16)
+def _measure_country_mean(measure):
+    """Per-country averages for one measure since 2000."""
+    df = _energy_frame()
+    return df[df["Measure"] == measure].groupby("Reference area", observed=True)["Value"].mean()
+
+
+@st.cache_data(ttl=3600, max_entries=16)
+def _measure_countries(measure):
+    """Sorted country labels present for one measure, memoized per selection."""
+    df = _energy_frame()
+    sub = df.loc[df["Measure"] == measure, "Reference area"]
+    return tuple(sub.cat.remove_unused_categories().categories)
+
+
+@st.cache_data(ttl=3600, max_entries=16)
+def _measure_csv_bytes(measure):
+    """UTF-8 CSV of one measure's rows, serialized once per selection."""
+    df = _energy_frame()
+    return df[df["Measure"] == measure].to_csv(index=False).encode("utf-8")
+
+
+@st.fragment
+def _trends_tab(selected_measure):
+    # Deferred: plotly.express is slow to import and only needed here
+    import plotly.express as px
 
-    # Global trend
     st.subheader(f"📈 Global Trend: {selected_measure}")
-    df_global = df_selected.groupby("Year")["Value"].sum().reset_index()
+    s_global = _measure_yearly_sum(selected_measure)
     fig_global = px.line(
-        df_global, x="Year", y="Value", markers=True,
+        x=s_global.index, y=s_global.values, markers=True, render_mode="webgl",
         title=f"{selected_measure} Over Time (Global Total)",
-        labels={"Value": "Energy (tonnes oil equivalent)"}
+        labels={"x": "Year", "y": "Energy (tonnes oil equivalent)"}
     )
     st.plotly_chart(fig_global, use_container_width=True)
 
-    # Top countries (average)
     st.subheader(f"🏆 Top 10 Countries by {selected_measure} (Avg since 2000)")
-    df_top = df_selected.groupby("Reference area")["Value"].mean().nlargest(10).reset_index()
+    s_top = top_k(_measure_country_mean(selected_measure), 10)
     fig_top = px.bar(
-        df_top, x="Reference area", y="Value", color="Value",
+        x=s_top.index, y=s_top.values, color=s_top.values,
         color_continuous_scale="Oranges",
         title=f"Top 10 Countries – {selected_measure}",
-        labels={"Value": "Avg Energy Use", "Reference area": "Country"}
+        labels={"x": "Country", "y": "Avg Energy Use", "color": "Avg Energy Use"}
     )
     st.plotly_chart(fig_top, use_container_width=True)
 
-    # Growth patterns
+
+@st.fragment
+def _growth_tab(selected_measure):
+    import plotly.express as px
+
     st.subheader("📊 Energy Growth Patterns")
-    growth_data = []
-    countries = df_selected['Reference area'].unique()
-
-    for country in countries:
-        country_data = df_selected[df_selected['Reference area'] == country].sort_values('Year')
-        if len(country_data) >= 10:
-            first_year = country_data.iloc[0]
-            last_year = country_data.iloc[-1]
-            years_span = last_year['Year'] - first_year['Year']
-
-            if years_span > 0 and first_year['Value'] > 0:
-                annual_growth = ((last_year['Value'] / first_year['Value']) ** (1/years_span) - 1) * 100
-                total_growth = ((last_year['Value'] - first_year['Value']) / first_year['Value']) * 100
-
-                growth_data.append({
-                    'Country': country,
-                    'Annual Growth Rate (%)': annual_growth,
-                    'Total Growth (%)': total_growth,
-                    'Start Year': first_year['Year'],
-                    'End Year': last_year['Year'],
-                    'Latest Consumption': last_year['Value']
-                })
-
-    df_growth = pd.DataFrame(growth_data)
+    df_energy = _energy_frame()
+    df_selected = df_energy[df_energy["Measure"] == selected_measure]
+
+    # One grouped pass instead of re-filtering the frame per country
+    g = df_selected.sort_values("Year").groupby("Reference area", observed=True)
+    agg = g.agg(
+        start_year=("Year", "first"),
+        end_year=("Year", "last"),
+        first_val=("Value", "first"),
+        last_val=("Value", "last"),
+        n=("Year", "size"),
+    )
+    agg = agg[(agg["n"] >= 10) & (agg["end_year"] > agg["start_year"]) & (agg["first_val"] > 0)]
+
+    years_span = agg["end_year"] - agg["start_year"]
+    df_growth = pd.DataFrame({
+        "Country": agg.index,
+        "Annual Growth Rate (%)": (np.power(agg["last_val"] / agg["first_val"], 1 / years_span) - 1) * 100,
+        "Total Growth (%)": (agg["last_val"] - agg["first_val"]) / agg["first_val"] * 100,
+        "Start Year": agg["start_year"],
+        "End Year": agg["end_year"],
+        "Latest Consumption": agg["last_val"],
+    }).reset_index(drop=True)
 
     if not df_growth.empty:
         col1, col2 = st.columns(2)
@@ -103,70 +141,94 @@ def section_energy():
             else:
                 st.info("No countries show declining energy consumption in this dataset.")
 
-    # Country drill-down
-    with st.expander("🔎 Country Trend Viewer"):
-        country_list = sorted(df_selected["Reference area"].dropna().unique())
-        selected_country = st.selectbox("🌍 Select Country", country_list)
-        df_country = df_selected[df_selected["Reference area"] == selected_country]
-
-        if not df_country.empty:
-            df_year = df_country.groupby("Year")["Value"].sum().reset_index()
-            fig_country = px.line(
-                df_year, x="Year", y="Value", markers=True,
-                title=f"{selected_country} – {selected_measure} Over Time",
-                labels={"Value": "Energy (tonnes oil equivalent)"}
-            )
-            st.plotly_chart(fig_country)
-
-    # Energy Efficiency Analysis (Ratio)
-    if set(energy_measures).issubset(set(df_energy["Measure"].unique())):
-        st.subheader("📊 Agricultural Energy Intensity (%)")
-
-        df_farm = df_energy[df_energy["Measure"] == "Direct on-farm energy consumption"]
-        df_total = df_energy[df_energy["Measure"] == "Total final energy consumption"]
-
-        latest_year = min(df_farm["Year"].max(), df_total["Year"].max())
-
-        farm_latest = df_farm[df_farm["Year"] == latest_year]
-        total_latest = df_total[df_total["Year"] == latest_year]
-
-        df_merge = pd.merge(
-            farm_latest[["Reference area", "Value"]],
-            total_latest[["Reference area", "Value"]],
-            on="Reference area", suffixes=("_farm", "_total")
+
+@st.fragment
+def _country_tab(selected_measure):
+    import plotly.express as px
+
+    st.subheader("🔎 Country Trend Viewer")
+    country_list = _measure_countries(selected_measure)
+    selected_country = st.selectbox("🌍 Select Country", country_list,
+                                    disabled=len(country_list) == 0)
+    s_year = _measure_yearly_sum(selected_measure, selected_country)
+
+    if s_year.shape[0]:
+        fig_country = px.line(
+            x=s_year.index, y=s_year.values, markers=True, render_mode="webgl",
+            title=f"{selected_country} – {selected_measure} Over Time",
+            labels={"x": "Year", "y": "Energy (tonnes oil equivalent)"}
         )
-        df_merge = df_merge[df_merge["Value_total"] > 0]
-        df_merge["Intensity (%)"] = (df_merge["Value_farm"] / df_merge["Value_total"]) * 100
+        st.plotly_chart(fig_country)
 
-        top_intensive = df_merge.nlargest(10, "Intensity (%)")
-        least_intensive = df_merge.nsmallest(10, "Intensity (%)")
 
-        col1, col2 = st.columns(2)
+@st.fragment
+def _intensity_tab():
+    import plotly.express as px
 
-        with col1:
-            st.markdown("#### 🚜 Highest Agricultural Share")
-            fig_high = px.bar(
-                top_intensive, x="Intensity (%)", y="Reference area", orientation="h",
-                color="Intensity (%)", color_continuous_scale="Reds",
-                labels={"Reference area": "Country"},
-                title="Top 10 Agricultural Energy-Intensive Countries"
-            )
-            st.plotly_chart(fig_high)
+    df_energy = _energy_frame()
+    if not set(ENERGY_MEASURES).issubset(df_energy["Measure"].cat.categories):
+        st.info("Both energy measures are needed for the intensity ratio.")
+        return
+
+    st.subheader("📊 Agricultural Energy Intensity (%)")
+
+    # Latest year covered by both measures
+    year_max = df_energy.groupby("Measure", observed=True)["Year"].max()
+    latest_year = int(year_max[ENERGY_MEASURES].min())
+
+    # One grouped scan puts both measures side by side per country,
+    # replacing the two filters plus merge on country keys.
+    pivot = df_energy[df_energy["Year"] == latest_year].pivot_table(
+        index="Reference area", columns="Measure", values="Value",
+        aggfunc="sum", observed=True
+    )
+    pivot = pivot[pivot["Total final energy consumption"] > 0]
+    pivot["Intensity (%)"] = (
+        pivot["Direct on-farm energy consumption"] /
+        pivot["Total final energy consumption"] * 100
+    )
+    df_merge = pivot.dropna(subset=["Intensity (%)"]).reset_index()
+
+    top_intensive = df_merge.nlargest(10, "Intensity (%)")
+    least_intensive = df_merge.nsmallest(10, "Intensity (%)")
+
+    col1, col2 = st.columns(2)
+
+    with col1:
+        st.markdown("#### 🚜 Highest Agricultural Share")
+        fig_high = px.bar(
+            top_intensive, x="Intensity (%)", y="Reference area", orientation="h",
+            color="Intensity (%)", color_continuous_scale="Reds",
+            labels={"Reference area": "Country"},
+            title="Top 10 Agricultural Energy-Intensive Countries"
+        )
+        st.plotly_chart(fig_high)
+
+    with col2:
+        st.markdown("#### 💡 Lowest Agricultural Share")
+        fig_low = px.bar(
+            least_intensive, x="Intensity (%)", y="Reference area", orientation="h",
+            color="Intensity (%)", color_continuous_scale="Blues",
+            labels={"Reference area": "Country"},
+            title="Top 10 Energy-Efficient Countries"
+        )
+        st.plotly_chart(fig_low)
+
+
+@st.fragment
+def _map_tab(selected_measure):
+    import plotly.express as px
 
-        with col2:
-            st.markdown("#### 💡 Lowest Agricultural Share")
-            fig_low = px.bar(
-                least_intensive, x="Intensity (%)", y="Reference area", orientation="h",
-                color="Intensity (%)", color_continuous_scale="Blues",
-                labels={"Reference area": "Country"},
-                title="Top 10 Energy-Efficient Countries"
-            )
-            st.plotly_chart(fig_low)
-
-    # Choropleth map
     st.subheader("🗺️ Global Distribution Map")
+    df_energy = _energy_frame()
+    df_selected = df_energy[df_energy["Measure"] == selected_measure]
     year_map = st.selectbox("Select Year", sorted(df_selected["Year"].unique(), reverse=True), key="energy_map")
-    df_map = df_selected[df_selected["Year"] == year_map].groupby("Reference area")["Value"].sum().reset_index()
+    # One row per country is expected for a single measure and year, so a
+    # linear de-dup replaces the hash-and-aggregate groupby
+    df_map = (
+        df_selected.loc[df_selected["Year"] == year_map, ["Reference area", "Value"]]
+        .drop_duplicates(subset="Reference area", keep="last")
+    )
 
     fig_map = px.choropleth(
         df_map, locations="Reference area", locationmode="country names",
@@ -175,14 +237,51 @@ def section_energy():
         title=f"{selected_measure} by Country ({year_map})",
         labels={"Value": "Energy Use"}
     )
+    # Preserve zoom/pan across reruns and let Plotly reuse the canvas
+    fig_map.update_layout(uirevision="map")
     st.plotly_chart(fig_map)
 
+
+def section_energy():
+    st.header("⚡ Energy Use in Agriculture")
+
+    st.markdown("""
+    Energy consumption in agriculture reflects production intensity, mechanization levels, and sustainability of food systems.  
+    This section explores **Direct On-Farm Energy Use** and **Total Final Energy Consumption**, with global and national insights.
+    """)
+
+    # Filter and select relevant measures
+    df_energy = _energy_frame()
+
+    if df_energy.empty:
+        st.warning("No energy-related data found.")
+        return
+
+    # Select energy measure
+    selected_measure = st.selectbox("🔋 Select Energy Measure", df_energy["Measure"].cat.categories.tolist())
+
+    # Fragments hosted in tabs: only the fragment whose widget changed
+    # reruns, and only the active tab's charts are visible at once
+    tab_trend, tab_growth, tab_country, tab_intensity, tab_map = st.tabs(
+        ["📈 Trends", "📊 Growth", "🔎 Country Viewer", "⚖️ Intensity", "🗺️ Map"]
+    )
+
+    with tab_trend:
+        _trends_tab(selected_measure)
+    with tab_growth:
+        _growth_tab(selected_measure)
+    with tab_country:
+        _country_tab(selected_measure)
+    with tab_intensity:
+        _intensity_tab()
+    with tab_map:
+        _map_tab(selected_measure)
+
     # Download
     st.markdown("### 📥 Download This Dataset")
-    csv_data = df_selected.to_csv(index=False)
     st.download_button(
         label="⬇️ Download CSV",
-        data=csv_data,
+        data=_measure_csv_bytes(selected_measure),
         file_name=f"{selected_measure.lower().replace(' ', '_')}_energy.csv",
         mime='text/csv'
     )
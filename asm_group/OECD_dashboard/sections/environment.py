@@ -1,15 +1,169 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
 import numpy as np
 from utils.db import load_table
+from utils.export import csv_bytes
+
+
+@st.cache_data(ttl=3600)
+def _agri_2012():
+    """Nutrient rows since 2012, projected and filtered server-side."""
+    return load_table(
+        "agri",
+        columns=("Reference area", "Year", "Nutrients", "Value"),
+        where="Year >= :min_year",
+        params={"min_year": 2012},
+    )
+
+
+@st.cache_data(ttl=3600)
+def _nutrient_frame(nutrient):
+    """Rows for one nutrient, sliced once per selection."""
+    agri = _agri_2012()
+    df = agri[agri["Nutrients"] == nutrient]
+    # Prune labels the slice removed so .cat.categories lists exactly
+    # the countries present and selectboxes can skip unique()+sort
+    return df.assign(**{"Reference area": df["Reference area"].cat.remove_unused_categories()})
+
+
+@st.cache_data(ttl=3600, max_entries=8)
+def _year_options(nutrient):
+    """Map years present for one nutrient, newest first."""
+    return tuple(sorted(_nutrient_frame(nutrient)["Year"].unique(), reverse=True))
+
+
+@st.cache_data(ttl=3600)
+def _global_trend(nutrient):
+    """Mean surplus per year across all countries."""
+    return _nutrient_frame(nutrient).groupby("Year")["Value"].mean().reset_index()
+
+
+@st.cache_data(ttl=3600, max_entries=64)
+def _country_trend(nutrient, country):
+    """Mean surplus per year for one country."""
+    df = _nutrient_frame(nutrient)
+    return df[df["Reference area"] == country].groupby("Year")["Value"].mean().reset_index()
+
+
+@st.cache_data(ttl=3600)
+def _top10(nutrient):
+    """Ten highest per-country average surpluses."""
+    return (
+        _nutrient_frame(nutrient)
+        .groupby("Reference area", observed=True)["Value"]
+        .mean()
+        .nlargest(10)
+        .reset_index()
+    )
+
+
+@st.cache_data(ttl=3600)
+def _heatmap(nutrient):
+    """Country × year surplus grid for the gradient table.
+
+    The grid is small (~50 countries × ~12 years), so a codes-indexed
+    NumPy accumulation fills it directly, skipping pivot_table's hashing
+    and intermediate group frames.
+    """
+    df = _nutrient_frame(nutrient).dropna(subset=["Reference area", "Value"])
+    countries = df["Reference area"].cat.remove_unused_categories()
+    years = pd.Categorical(df["Year"])
+
+    sums = np.zeros((len(countries.cat.categories), len(years.categories)))
+    counts = np.zeros_like(sums)
+    cells = (countries.cat.codes.to_numpy(), years.codes)
+    np.add.at(sums, cells, df["Value"].to_numpy())
+    np.add.at(counts, cells, 1)
+    with np.errstate(invalid="ignore"):
+        grid = sums / counts  # empty cells become NaN, as pivot_table yields
+
+    return pd.DataFrame(
+        grid, index=countries.cat.categories, columns=years.categories
+    ).rename_axis(index="Reference area", columns="Year")
+
+
+@st.cache_data(ttl=3600, max_entries=8)
+def _value_histogram(nutrient, bins=50):
+    """Pre-binned surplus distribution.
+
+    Binning server-side ships 50 bar heights to the browser instead of
+    every raw row for client-side binning.
+    """
+    values = _nutrient_frame(nutrient)["Value"].dropna().to_numpy()
+    counts, edges = np.histogram(values, bins=bins)
+    centers = 0.5 * (edges[:-1] + edges[1:])
+    return centers, counts
+
+
+@st.cache_data(ttl=3600, max_entries=64)
+def _choropleth_frame(nutrient, year):
+    """Per-country mean surplus for one map year."""
+    df = _nutrient_frame(nutrient)
+    return df[df["Year"] == year].groupby("Reference area", observed=True)["Value"].mean().reset_index()
+
+
+@st.cache_data(ttl=3600)
+def _arable_series():
+    """Arable-land hectares keyed by (country, year), built once.
+
+    The arable rows never vary with the nutrient widget, so the regex
+    scan and indexing happen a single time per session.
+    """
+    area = load_table("area")
+    arable = area[area["Measure"].str.lower().str.contains("arable", na=False)]
+    return arable.set_index(["Reference area", "Year"])["Value"].rename("Value_area")
+
+
+@st.cache_data(ttl=3600)
+def _normalized_frame(nutrient):
+    """Surplus rows with arable hectares joined on (country, year)."""
+    df = _nutrient_frame(nutrient).rename(columns={"Value": "Value_surplus"})
+    df_norm = df.join(_arable_series(), on=["Reference area", "Year"])
+    df_norm = df_norm.dropna(subset=["Value_area"])
+    df_norm["Surplus per hectare"] = df_norm["Value_surplus"] / df_norm["Value_area"]
+    return df_norm
+
+
+@st.cache_data(ttl=3600)
+def _top10_normalized(nutrient):
+    """Ten highest per-country normalized surpluses."""
+    return (
+        _normalized_frame(nutrient)
+        .groupby("Reference area", observed=True)["Surplus per hectare"]
+        .mean()
+        .nlargest(10)
+        .reset_index()
+    )
+
+
+@st.cache_data(ttl=3600)
+def _country_avg_norm(nutrient):
+    """Per-country average normalized surplus."""
+    return (
+        _normalized_frame(nutrient)
+        .groupby("Reference area", observed=True)["Surplus per hectare"]
+        .mean()
+        .reset_index()
+    )
+
+
+@st.cache_data(ttl=3600)
+def _np_pivot():
+    """Average N vs P surplus per country, side by side."""
+    agri = _agri_2012()
+    df_compare = agri[agri["Nutrients"].isin(["Nitrogen", "Phosphorus"])]
+    return df_compare.groupby(["Reference area", "Nutrients"], observed=True)["Value"].mean().unstack().dropna()
+
 
 def section_environment():
+    # Deferred: plotly.express is slow to import and only needed here
+    import plotly.express as px
+
     st.header("🌱 Environmental Impact: Nutrient Surpluses")
 
-    # Load data
-    agri = load_table("agri")
-    area = load_table("area")
+    # Load data — _agri_2012 projects and filters server-side: this
+    # section only reads nutrient rows since 2012
+    agri = _agri_2012()
 
     st.markdown("""
     Excess **Nitrogen (N)** and **Phosphorus (P)** from agriculture can lead to water pollution, soil degradation, and greenhouse gas emissions.  
@@ -19,17 +173,17 @@ def section_environment():
     # ------------------------
     # Nutrient Selection
     # ------------------------
-    nutrient_options = agri['Nutrients'].dropna().unique()
+    nutrient_options = agri["Nutrients"].cat.categories.tolist()
     nutrient = st.selectbox("🔬 Select Nutrient", nutrient_options)
-    agri_filtered = agri[(agri['Nutrients'] == nutrient) & (agri['Year'] >= 2012)]
+    agri_filtered = _nutrient_frame(nutrient)
 
     # ------------------------
     # Global Trend
     # ------------------------
     st.subheader(f"📈 {nutrient} Surplus Over Time (Global Average)")
     st.markdown(f"Average {nutrient} surplus across all countries since 2012.")
-    df_yearly = agri_filtered.groupby('Year')['Value'].mean().reset_index()
-    fig_trend = px.line(df_yearly, x='Year', y='Value', markers=True,
+    df_yearly = _global_trend(nutrient)
+    fig_trend = px.line(df_yearly, x='Year', y='Value', markers=True, render_mode="webgl",
                         labels={"Value": f"{nutrient} Surplus (kg/ha)"})
     st.plotly_chart(fig_trend)
 
@@ -37,13 +191,12 @@ def section_environment():
     # Country Drill-down
     # ------------------------
     with st.expander("🔎 Country-level Trend"):
-        country_list = agri_filtered["Reference area"].dropna().unique()
-        selected_country = st.selectbox("🌐 Select a Country", sorted(country_list))
-        df_country = agri_filtered[agri_filtered["Reference area"] == selected_country]
-        df_country_yearly = df_country.groupby("Year")["Value"].mean().reset_index()
+        country_list = agri_filtered["Reference area"].cat.categories.tolist()
+        selected_country = st.selectbox("🌐 Select a Country", country_list)
+        df_country_yearly = _country_trend(nutrient, selected_country)
 
         fig_country = px.line(
-            df_country_yearly, x="Year", y="Value", markers=True,
+            df_country_yearly, x="Year", y="Value", markers=True, render_mode="webgl",
             title=f"{nutrient} Surplus Over Time: {selected_country}",
             labels={"Value": f"{nutrient} Surplus (kg/ha)"}
         )
@@ -54,7 +207,7 @@ def section_environment():
     # ------------------------
     st.subheader(f"🌡️ {nutrient} Surplus by Country and Year")
     st.markdown("Heatmap showing intensity of nutrient surplus across countries over time.")
-    df_heatmap = agri_filtered.pivot_table(index="Reference area", columns="Year", values="Value")
+    df_heatmap = _heatmap(nutrient)
     st.dataframe(df_heatmap.style.background_gradient(cmap="YlGnBu", axis=1))
 
     # ------------------------
@@ -62,7 +215,7 @@ def section_environment():
     # ------------------------
     st.subheader(f"🏆 Top 10 {nutrient} Surplus Countries (Raw Average)")
     st.markdown("Shows countries with highest average nutrient surplus since 2012 (not normalized).")
-    df_top = agri_filtered.groupby('Reference area')['Value'].mean().nlargest(10).reset_index()
+    df_top = _top10(nutrient)
     fig_top = px.bar(df_top, x='Reference area', y='Value', color='Value',
                      labels={'Value': f'{nutrient} Surplus (kg/ha)'},
                      color_continuous_scale='viridis')
@@ -73,16 +226,17 @@ def section_environment():
     # ------------------------
     with st.expander("📊 Distribution of Surplus Values"):
         st.markdown("Distribution of raw surplus values (check for skew or outliers).")
-        fig_hist = px.histogram(agri_filtered, x='Value', nbins=50,
-                                labels={'Value': f'{nutrient} Surplus (kg/ha)'})
+        centers, counts = _value_histogram(nutrient)
+        fig_hist = px.bar(x=centers, y=counts,
+                          labels={'x': f'{nutrient} Surplus (kg/ha)', 'y': 'count'})
         st.plotly_chart(fig_hist)
 
     # ------------------------
     # Choropleth
     # ------------------------
     st.subheader("🗺️ Choropleth Map: Nutrient Surplus by Country")
-    selected_year = st.selectbox("📅 Select Year", sorted(agri_filtered['Year'].unique(), reverse=True))
-    df_map = agri_filtered[agri_filtered['Year'] == selected_year].groupby('Reference area')['Value'].mean().reset_index()
+    selected_year = st.selectbox("📅 Select Year", _year_options(nutrient))
+    df_map = _choropleth_frame(nutrient, selected_year)
     fig_map = px.choropleth(df_map, locations="Reference area", locationmode="country names",
                             color="Value", hover_name="Reference area",
                             color_continuous_scale="YlOrRd",
@@ -94,8 +248,7 @@ def section_environment():
     # ------------------------
     st.subheader("🔬 Nitrogen vs Phosphorus Comparison")
     st.markdown("Explore nutrient imbalance by comparing average N vs P surplus per country.")
-    df_compare = agri[agri['Nutrients'].isin(['Nitrogen', 'Phosphorus']) & (agri['Year'] >= 2012)]
-    df_pivot = df_compare.groupby(['Reference area', 'Nutrients'])['Value'].mean().unstack().dropna()
+    df_pivot = _np_pivot()
 
     fig_scatter = px.scatter(df_pivot, x='Nitrogen', y='Phosphorus', hover_name=df_pivot.index,
                              color_discrete_sequence=['green'],
@@ -115,14 +268,11 @@ def section_environment():
     Surplus values divided by arable land area (from land-use dataset) to allow meaningful cross-country comparisons.
     """)
 
-    area_filtered = area[area['Measure'].str.lower().str.contains("arable", na=False)]
-    df_norm = pd.merge(agri_filtered, area_filtered,
-                       on=["Reference area", "Year"], suffixes=("_surplus", "_area"))
-    df_norm['Surplus per hectare'] = df_norm['Value_surplus'] / df_norm['Value_area']
+    df_norm = _normalized_frame(nutrient)
 
     # --- Top countries by normalized surplus
     st.markdown("#### 🏆 Top 10 Countries by Normalized Surplus")
-    df_norm_top = df_norm.groupby("Reference area")["Surplus per hectare"].mean().nlargest(10).reset_index()
+    df_norm_top = _top10_normalized(nutrient)
     fig_norm = px.bar(df_norm_top, x="Reference area", y="Surplus per hectare",
                       color="Surplus per hectare", color_continuous_scale="viridis",
                       labels={"Surplus per hectare": f"Normalized {nutrient} Surplus (kg/ha)"},
@@ -131,8 +281,13 @@ def section_environment():
 
     # --- Outliers
     st.markdown("#### 📌 Outlier Countries (Top 5%)")
-    df_country_avg = df_norm.groupby("Reference area")["Surplus per hectare"].mean().reset_index()
-    threshold = np.percentile(df_country_avg["Surplus per hectare"].dropna(), 95)
+    df_country_avg = _country_avg_norm(nutrient)
+    # One scalar cutoff doesn't need np.percentile's full sort: an O(n)
+    # partition places the 95th-percentile element in position
+    arr = df_country_avg["Surplus per hectare"].to_numpy()
+    arr = arr[~np.isnan(arr)]
+    k = int(0.95 * len(arr))
+    threshold = np.partition(arr, k)[k] if k < len(arr) else arr.max()
     outlier_avg = df_country_avg[df_country_avg["Surplus per hectare"] >= threshold].sort_values(
         "Surplus per hectare", ascending=False)
     st.dataframe(outlier_avg.reset_index(drop=True))
@@ -140,10 +295,9 @@ def section_environment():
 
     # --- Download CSV
     st.markdown("#### 📥 Download Normalized Dataset")
-    csv = df_norm.to_csv(index=False)
     st.download_button(
         label="⬇️ Download Normalized Surplus Data as CSV",
-        data=csv,
+        data=csv_bytes(df_norm),
         file_name=f"normalized_{nutrient.lower()}_surplus.csv",
         mime='text/csv'
     )
\ No newline at end of file
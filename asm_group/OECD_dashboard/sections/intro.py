@@ -1,6 +1,5 @@
 import streamlit as st
-import pandas as pd
-from utils.db import load_table
+from utils.db import load_tables
 
 def section_intro():
     st.title("🌍 OECD Agricultural Sustainability Dashboard")
@@ -21,11 +20,12 @@ def section_intro():
     Data spans from **2012 onwards**, sourced and cleaned from the [OECD Data Explorer](https://data-explorer.oecd.org/).
     """)
 
-    # --- Load datasets ---
-    agri = load_table("agri")
-    area = load_table("area")
-    water = load_table("water")
-    energy = load_table("energy")
+    # --- Load datasets (one overlapped round-trip instead of four serial ones) ---
+    tables = load_tables(("agri", "area", "water", "energy"))
+    agri = tables["agri"]
+    area = tables["area"]
+    water = tables["water"]
+    energy = tables["energy"]
 
     # --- Section: Agri ---
     st.markdown("### 🌍 Agricultural Production & Environmental Impact")
@@ -1,49 +1,85 @@
 import streamlit as st
 import pandas as pd
-from utils.db import load_table
+from utils.db import load_table, column_options
+from utils.export import csv_bytes
 
+# Measure-level columns summed per (country, year); nutrient surpluses are averaged
+SUMMARY_MEASURE_LABELS = {
+    "Total greenhouse gas emissions": "GHG Emissions (tonnes)",
+    "Agriculture freshwater abstraction": "Water Use (m³)",
+    "Arable land": "Arable Land (ha)",
+}
+SUMMARY_NUTRIENT_LABELS = {
+    "Nitrogen": "Nitrogen Surplus (kg/ha)",
+    "Phosphorus": "Phosphorus Surplus (kg/ha)",
+}
 
-def section_summary():
-    st.subheader("📊 Sustainability Summary Table")
 
-    # Load data
+@st.cache_data
+def _summary_frame(countries: tuple, years: tuple) -> pd.DataFrame:
+    """Summary grid for the selected countries/years in two grouped passes.
+
+    Replaces the old country × year Python loop, which re-filtered the
+    tables with six boolean masks per cell.
+    """
     agri = load_table("agri")
     energy = load_table("energy")
 
+    agri_filtered = agri[agri["Reference area"].isin(countries) & agri["Year"].isin(years)]
+    energy_filtered = energy[energy["Reference area"].isin(countries) & energy["Year"].isin(years)]
+
+    nutrient_means = agri_filtered.pivot_table(
+        "Value", ["Reference area", "Year"], "Nutrients", aggfunc="mean", observed=True
+    ).rename(columns=SUMMARY_NUTRIENT_LABELS)
+    measure_sums = agri_filtered[agri_filtered["Measure"].isin(SUMMARY_MEASURE_LABELS)].pivot_table(
+        "Value", ["Reference area", "Year"], "Measure", aggfunc="sum", observed=True
+    ).rename(columns=SUMMARY_MEASURE_LABELS)
+    energy_sums = (
+        energy_filtered[energy_filtered["Measure"] == "Direct on-farm energy consumption"]
+        .groupby(["Reference area", "Year"], observed=True)["Value"]
+        .sum()
+        .rename("Energy Use (TOE)")
+    )
+
+    # One row per selected (country, year) even with no data, matching the
+    # loop semantics: sums of nothing are 0, means of nothing stay NaN
+    full_index = pd.MultiIndex.from_product([countries, years], names=["Reference area", "Year"])
+    df = pd.concat([nutrient_means, measure_sums, energy_sums], axis=1).reindex(full_index)
+
+    sum_cols = list(SUMMARY_MEASURE_LABELS.values()) + ["Energy Use (TOE)"]
+    for col in sum_cols:
+        if col not in df.columns:
+            df[col] = 0.0
+    df[sum_cols] = df[sum_cols].fillna(0)
+
+    for col in SUMMARY_NUTRIENT_LABELS.values():
+        if col not in df.columns:
+            df[col] = float("nan")
+
+    df = df.reset_index().rename(columns={"Reference area": "Country"})
+    return df[[
+        "Country", "Year",
+        "Nitrogen Surplus (kg/ha)", "Phosphorus Surplus (kg/ha)",
+        "GHG Emissions (tonnes)", "Energy Use (TOE)", "Water Use (m³)", "Arable Land (ha)",
+    ]]
+
+
+def section_summary():
+    st.subheader("📊 Sustainability Summary Table")
+
     # Select countries and years
-    countries = sorted(agri["Reference area"].dropna().unique())
+    countries = column_options("agri", "Reference area")
     selected_countries = st.multiselect("🌍 Select Countries", countries, default=["France", "Germany", "Mexico"])
 
-    years = sorted(agri["Year"].dropna().unique())
+    years = column_options("agri", "Year")
     selected_years = st.multiselect("📅 Select Years", years, default=[max(years)])
 
     if not selected_countries or not selected_years:
         st.warning("Please select at least one country and one year.")
         return
 
-    # Filter data
-    agri_filtered = agri[agri["Reference area"].isin(selected_countries) & agri["Year"].isin(selected_years)]
-    energy_filtered = energy[energy["Reference area"].isin(selected_countries) & energy["Year"].isin(selected_years)]
-
     # Build summary table
-    summary_data = []
-    for country in selected_countries:
-        for year in selected_years:
-            agri_c = agri_filtered[(agri_filtered["Reference area"] == country) & (agri_filtered["Year"] == year)]
-            energy_c = energy_filtered[(energy_filtered["Reference area"] == country) & (energy_filtered["Year"] == year)]
-
-            summary_data.append({
-                "Country": country,
-                "Year": year,
-                "Nitrogen Surplus (kg/ha)": agri_c[agri_c["Nutrients"] == "Nitrogen"]["Value"].mean(),
-                "Phosphorus Surplus (kg/ha)": agri_c[agri_c["Nutrients"] == "Phosphorus"]["Value"].mean(),
-                "GHG Emissions (tonnes)": agri_c[agri_c["Measure"] == "Total greenhouse gas emissions"]["Value"].sum(),
-                "Energy Use (TOE)": energy_c[energy_c["Measure"] == "Direct on-farm energy consumption"]["Value"].sum(),
-                "Water Use (m³)": agri_c[agri_c["Measure"] == "Agriculture freshwater abstraction"]["Value"].sum(),
-                "Arable Land (ha)": agri_c[agri_c["Measure"] == "Arable land"]["Value"].sum(),
-            })
-
-    df_summary = pd.DataFrame(summary_data)
+    df_summary = _summary_frame(tuple(selected_countries), tuple(selected_years))
     df_summary = df_summary.sort_values(by=["Year", "Country"]).reset_index(drop=True)
 
     # Format for display
@@ -63,7 +99,7 @@ def section_summary():
     st.markdown("---")
     st.download_button(
         label="⬇️ Download Summary as CSV",
-        data=df_summary.to_csv(index=False),
+        data=csv_bytes(df_summary),
         file_name="sustainability_summary.csv",
         mime="text/csv"
-    )
\ No newline at end of file
+    )
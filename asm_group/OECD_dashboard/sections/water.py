@@ -1,13 +1,110 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
+import numpy as np
 from utils.db import load_table
+from utils.export import csv_bytes
 
+WATER_MEASURES = [
+    "Agriculture freshwater abstraction",
+    "Total freshwater abstraction",
+    "Irrigable area",
+    "Irrigation area"
+]
 
-def section_water():
-    st.header("💧 Water Use in Agriculture")
 
+@st.cache_data(ttl=3600)
+def _water_frame():
+    """Water rows (cubic metres/hectares, 2012+), filtered once per session.
+
+    The unit match runs over the few dozen category labels instead of
+    regex-scanning every row; the per-row filter is then isin over
+    integer codes.
+    """
     agri = load_table("agri")
+    unit_cats = agri["Unit of measure"].cat.categories
+    water_units = unit_cats[unit_cats.str.contains("Cubic metres|Hectares", na=False)]
+    df = agri[
+        agri["Measure"].isin(WATER_MEASURES) &
+        agri["Unit of measure"].isin(water_units) &
+        (agri["Year"] >= 2012)
+    ]
+    # Prune labels the filter removed so .cat.categories lists exactly
+    # the values present and selectboxes can skip unique()+sort
+    return df.assign(**{
+        c: df[c].cat.remove_unused_categories() for c in ("Measure", "Reference area")
+    })
+
+
+@st.cache_data(ttl=3600, max_entries=16)
+def _measure_frame(measure):
+    """Rows for one water measure, sliced once per selection."""
+    df = _water_frame()
+    return df[df["Measure"] == measure]
+
+
+@st.cache_data(ttl=3600, max_entries=16)
+def _year_options(measure):
+    """Map years present for one measure, newest first."""
+    return tuple(sorted(_measure_frame(measure)["Year"].unique(), reverse=True))
+
+
+@st.cache_data(ttl=3600, max_entries=16)
+def _country_options(measure):
+    """Country labels present for one measure, memoized per selection."""
+    countries = _measure_frame(measure)["Reference area"]
+    return tuple(countries.cat.remove_unused_categories().cat.categories)
+
+
+@st.cache_data(ttl=3600, max_entries=64)
+def _yearly_sum(measure, country=None):
+    """Per-year totals for one measure, optionally one country.
+
+    Sorting by year and reducing with np.add.reduceat skips the
+    hash-table build a groupby pays; NaNs count as zero, matching
+    groupby's skipna sums.
+    """
+    df = _measure_frame(measure)
+    if country is not None:
+        df = df[df["Reference area"] == country]
+    order = np.argsort(df["Year"].to_numpy(), kind="stable")
+    years, starts = np.unique(df["Year"].to_numpy()[order], return_index=True)
+    sums = np.add.reduceat(np.nan_to_num(df["Value"].to_numpy()[order]), starts) if len(order) else []
+    return pd.DataFrame({"Year": years, "Value": sums})
+
+
+@st.cache_data(ttl=3600, max_entries=16)
+def _top10_mean(measure):
+    """Ten highest per-country averages for one measure."""
+    df = _measure_frame(measure)
+    return df.groupby("Reference area", observed=True)["Value"].mean().nlargest(10).reset_index()
+
+
+@st.cache_data(ttl=3600, max_entries=64)
+def _map_frame(measure, year):
+    """Per-country totals for one map year."""
+    df = _measure_frame(measure)
+    return df[df["Year"] == year].groupby("Reference area", observed=True)["Value"].sum().reset_index()
+
+
+@st.cache_data(ttl=3600, max_entries=16)
+def _water_type_breakdown(measure):
+    """Per-year totals split by water type."""
+    df = _measure_frame(measure)
+    return df.groupby(["Year", "Water type"], observed=True)["Value"].sum().reset_index()
+
+
+@st.cache_data(ttl=3600, max_entries=16)
+def _top20_total(measure):
+    """Twenty highest per-country totals for one measure."""
+    df = _measure_frame(measure)
+    return df.groupby("Reference area", observed=True)["Value"].sum().nlargest(20).reset_index()
+
+
+def section_water():
+    # Deferred: plotly.express is slow to import and only needed here
+    import plotly.express as px
+
+    st.header("💧 Water Use in Agriculture")
 
     st.markdown("""
     Water is a vital input for agricultural production, but excessive use can deplete freshwater resources.  
@@ -17,18 +114,7 @@ def section_water():
     # ----------------------------------------
     # Filter water-related measures
     # ----------------------------------------
-    water_measures = [
-        "Agriculture freshwater abstraction",
-        "Total freshwater abstraction",
-        "Irrigable area",
-        "Irrigation area"
-    ]
-
-    df_water = agri[
-        agri["Measure"].isin(water_measures) &
-        agri["Unit of measure"].str.contains("Cubic metres|Hectares", na=False) &
-        (agri["Year"] >= 2012)
-    ]
+    df_water = _water_frame()
 
     if df_water.empty:
         st.warning("No water-related data found.")
@@ -37,17 +123,17 @@ def section_water():
     # ----------------------------------------
     # Water measure selection
     # ----------------------------------------
-    selected_measure = st.selectbox("🚰 Select Water Measure", sorted(df_water["Measure"].unique()))
-    df_selected = df_water[df_water["Measure"] == selected_measure]
+    selected_measure = st.selectbox("🚰 Select Water Measure", df_water["Measure"].cat.categories.tolist())
+    df_selected = _measure_frame(selected_measure)
 
     # ----------------------------------------
     # Global trend over time
     # ----------------------------------------
     st.subheader(f"📈 Global Trend: {selected_measure}")
-    df_global = df_selected.groupby("Year")["Value"].sum().reset_index()
+    df_global = _yearly_sum(selected_measure)
 
     fig_trend = px.line(
-        df_global, x="Year", y="Value", markers=True,
+        df_global, x="Year", y="Value", markers=True, render_mode="webgl",
         labels={"Value": "Total (cubic metres or hectares)"},
         title=f"{selected_measure} Over Time (Global Total)"
     )
@@ -57,7 +143,7 @@ def section_water():
     # Top countries by average
     # ----------------------------------------
     st.subheader(f"🏆 Top 10 Countries by {selected_measure} (Avg since 2012)")
-    df_top = df_selected.groupby("Reference area")["Value"].mean().nlargest(10).reset_index()
+    df_top = _top10_mean(selected_measure)
 
     fig_top = px.bar(
         df_top, x="Reference area", y="Value", color="Value",
@@ -71,9 +157,8 @@ def section_water():
     # Choropleth Map
     # ----------------------------------------
     st.subheader("🌍 Water Use Choropleth Map")
-    year_map = st.selectbox("Select Year for Map", sorted(df_selected["Year"].unique(), reverse=True), key="map_year")
-    df_map = df_selected[df_selected["Year"] == year_map]
-    df_map_grouped = df_map.groupby("Reference area")["Value"].sum().reset_index()
+    year_map = st.selectbox("Select Year for Map", _year_options(selected_measure), key="map_year")
+    df_map_grouped = _map_frame(selected_measure, year_map)
 
     fig_map = px.choropleth(
         df_map_grouped, locations="Reference area", locationmode="country names",
@@ -88,13 +173,11 @@ def section_water():
     # Drill-down by country with stats
     # ----------------------------------------
     with st.expander("🔎 Explore Country Trend"):
-        country_list = sorted(df_selected["Reference area"].dropna().unique())
+        country_list = _country_options(selected_measure)
         selected_country = st.selectbox("🌏 Select a Country", country_list)
-        df_country = df_selected[df_selected["Reference area"] == selected_country]
-
-        df_country_trend = df_country.groupby("Year")["Value"].sum().reset_index()
+        df_country_trend = _yearly_sum(selected_measure, selected_country)
         fig_country = px.line(
-            df_country_trend, x="Year", y="Value", markers=True,
+            df_country_trend, x="Year", y="Value", markers=True, render_mode="webgl",
             title=f"{selected_country} – {selected_measure} Over Time",
             labels={"Value": "Usage"}
         )
@@ -116,7 +199,7 @@ def section_water():
     # ----------------------------------------
     if "Water type" in df_selected.columns and df_selected["Water type"].nunique() > 1:
         st.subheader("💧 Breakdown by Water Type")
-        df_water_type = df_selected.groupby(["Year", "Water type"])["Value"].sum().reset_index()
+        df_water_type = _water_type_breakdown(selected_measure)
 
         fig_water_type = px.area(
             df_water_type, x="Year", y="Value", color="Water type",
@@ -129,7 +212,7 @@ def section_water():
     # Treemap of top 20 contributors
     # ----------------------------------------
     st.subheader("🌳 Treemap: Top 20 Countries by Total Usage")
-    top20 = df_selected.groupby("Reference area")["Value"].sum().nlargest(20).reset_index()
+    top20 = _top20_total(selected_measure)
 
     fig_treemap = px.treemap(
         top20, path=['Reference area'], values='Value', color='Value',
@@ -142,10 +225,9 @@ def section_water():
     # Download
     # ----------------------------------------
     st.markdown("### 📅 Download This Dataset")
-    csv = df_selected.to_csv(index=False)
     st.download_button(
         label="⬇️ Download CSV",
-        data=csv,
+        data=csv_bytes(df_selected),
         file_name=f"{selected_measure.lower().replace(' ', '_')}_water_data.csv",
         mime='text/csv'
     )
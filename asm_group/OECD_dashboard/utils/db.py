@@ -1,9 +1,26 @@
 # utils/db.py
 
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 from sqlalchemy import create_engine, text
 import streamlit as st
 
+try:
+    # Optional fast path: deserializes result sets straight into typed
+    # columnar buffers instead of the per-row Python objects pd.read_sql
+    # allocates. The SQLAlchemy path below covers environments without it.
+    import connectorx as cx
+except ImportError:
+    cx = None
+
+# Local Parquet copies of the tables; parsing these is far faster than
+# re-issuing SELECT * over the remote MySQL link on a cold session.
+_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache")
+_PARQUET_TTL = 24 * 3600  # seconds before an on-disk copy is refreshed from MySQL
+
 @st.cache_resource
 def get_db_engine():
     username = "root"
@@ -13,14 +30,103 @@ def get_db_engine():
     database = "railway"
 
     connection_string = f"mysql+pymysql://{username}:{password}@{host}:{port}/{database}"
-    return create_engine(connection_string)
+    return create_engine(connection_string, pool_size=4, pool_pre_ping=True)
+
+def _db_url():
+    """The engine's URL as a plain mysql:// string, for connectorx."""
+    url = get_db_engine().url.render_as_string(hide_password=False)
+    return url.replace("mysql+pymysql://", "mysql://")
+
+@st.cache_data(ttl=3600, max_entries=8, show_spinner=False)
+def load_table(table_name, columns=None, where=None, params=None):
+    """Load a table from MySQL, optionally projecting columns and pushing
+    a WHERE clause (with :named bind params) server-side.
+
+    Projection/filter loads ship fewer bytes over the wire; an index on
+    (Year, Measure) server-side makes the filtered scans cheap. Only
+    full-table loads use the on-disk Parquet copies — filtered loads rely
+    on st.cache_data memoization alone.
+    """
+    full_load = columns is None and where is None
+    cache_path = os.path.join(_CACHE_DIR, f"{table_name}.parquet")
+    if full_load:
+        try:
+            fresh = time.time() - os.path.getmtime(cache_path) < _PARQUET_TTL
+        except OSError:
+            fresh = False
+        if fresh:
+            return pd.read_parquet(cache_path, engine="pyarrow")
+
+    cols_sql = ", ".join(f"`{c}`" for c in columns) if columns else "*"
+    sql = f"SELECT {cols_sql} FROM {table_name}"
+    if where:
+        sql += f" WHERE {where}"
+
+    if cx is not None and params is None:
+        # connectorx takes a plain mysql:// URL and no bind params
+        df = cx.read_sql(_db_url(), sql, return_type="pandas")
+    else:
+        engine = get_db_engine()
+        with engine.connect() as connection:
+            df = pd.read_sql(text(sql), con=connection, params=params)
+
+    # Repeatedly compared/grouped string columns are far cheaper as
+    # categoricals: comparisons run on integer codes instead of Python
+    # strings, and memory drops sharply on these long tables. Every
+    # object column here is a low-cardinality label (Water type, Erosion
+    # risk level, Observation status, ...), so convert them all.
+    for col in df.select_dtypes(include="object").columns:
+        df[col] = df[col].astype("category")
+
+    # Aggregations over Value/Year are memory-bound; narrower numerics
+    # halve the bytes each groupby scan reads, and OECD magnitudes sit
+    # comfortably within float32 display precision
+    if "Value" in df.columns:
+        df["Value"] = pd.to_numeric(df["Value"], downcast="float")
+    if "Year" in df.columns:
+        df["Year"] = pd.to_numeric(df["Year"], downcast="integer")
+
+    # Best-effort: a failed write just means the next cold start hits SQL again
+    if full_load:
+        try:
+            os.makedirs(_CACHE_DIR, exist_ok=True)
+            df.to_parquet(cache_path, engine="pyarrow", compression="zstd")
+        except Exception:
+            pass
+
+    return df
+
+@st.cache_data(ttl=3600)
+def column_options(table_name, column):
+    """Sorted unique values of a column, cached for widget option lists.
+
+    Keeps selectbox/multiselect reruns from rescanning and re-sorting a
+    full column just to rebuild the same options.
+    """
+    s = load_table(table_name)[column]
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        # Categories are already unique, sorted, and NaN-free
+        return tuple(s.cat.categories)
+    return tuple(sorted(s.dropna().unique()))
+
+@st.cache_data(ttl=3600, max_entries=8)
+def load_table_indexed(table_name, index_cols=("Reference area", "Year", "Measure")):
+    """Return the table keyed by a sorted MultiIndex.
 
-@st.cache_data
-def load_table(table_name):
-    engine = get_db_engine()
-    query = text(f"SELECT * FROM {table_name}")
+    Point lookups via .loc on the sorted index avoid the full-column
+    boolean scans that chained mask filters pay on every rerun.
+    """
+    df = load_table(table_name)
+    return df.set_index(list(index_cols)).sort_index()
 
-    with engine.connect() as connection:
-        df = pd.read_sql(query, con=connection)
+def load_tables(names):
+    """Load several tables concurrently, returned as {name: DataFrame}.
 
-    return df
\ No newline at end of file
+    The MySQL driver releases the GIL while reading, so a small thread
+    pool overlaps the cold-start round-trips instead of paying them one
+    after another. Results come from load_table, so warm calls are
+    cache hits and no extra memoization layer is needed here.
+    """
+    with ThreadPoolExecutor(max_workers=len(names)) as pool:
+        frames = list(pool.map(load_table, names))
+    return dict(zip(names, frames))
@@ -0,0 +1,14 @@
+# utils/export.py
+
+import streamlit as st
+
+
+@st.cache_data(max_entries=32)
+def csv_bytes(df):
+    """CSV bytes for a download button, generated once per unique frame.
+
+    st.download_button needs the payload on every rerun, but caching on
+    the DataFrame means the CSV serialization only happens when the
+    underlying selection actually changed.
+    """
+    return df.to_csv(index=False).encode("utf-8")
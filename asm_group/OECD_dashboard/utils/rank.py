@@ -0,0 +1,18 @@
+# utils/rank.py
+
+import numpy as np
+
+
+def top_k(series, k=10):
+    """Largest k entries of a Series, highest first.
+
+    np.argpartition picks the k winners in O(N) and only those k are then
+    sorted, instead of the full sort nlargest runs. NaNs are dropped to
+    match nlargest semantics.
+    """
+    series = series.dropna()
+    if series.shape[0] <= k:
+        return series.sort_values(ascending=False)
+    vals = series.to_numpy()
+    idx = np.argpartition(-vals, k)[:k]
+    return series.iloc[idx[np.argsort(-vals[idx])]]
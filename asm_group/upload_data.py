@@ -8,10 +8,6 @@ host = "shuttle.proxy.rlwy.net"
 port = 58689
 database = "railway"
 
-# Kết nối tới MySQL
-connection_str = f"mysql+pymysql://{username}:{password}@{host}:{port}/{database}"
-engine = create_engine(connection_str)
-
 tables = {
     "agri": "OECD_dashboard\\data\\agri_cleaned.csv",
     "area": "OECD_dashboard\\data\\area_cleaned.csv",
@@ -19,11 +15,29 @@ tables = {
     "water": "OECD_dashboard\\data\\water_cleaned.csv"
 }
 
-# Upload
-for table_name, file_name in tables.items():
-    try:
-        df = pd.read_csv(file_name)
-        df.to_sql(table_name, con=engine, if_exists="replace", index=False)
-        print(f"✅ Uploaded {file_name} to MySQL table `{table_name}`")
-    except Exception as e:
-        print(f"❌ Failed to upload {file_name}: {e}")
\ No newline at end of file
+
+def upload_csv(engine, table_name, file_name, chunksize=50_000):
+    # Đọc và upload theo từng chunk: không cần giữ cả file trong bộ nhớ,
+    # và method="multi" gom nhiều dòng vào mỗi câu INSERT
+    first = True
+    for chunk in pd.read_csv(file_name, chunksize=chunksize):
+        chunk.to_sql(
+            table_name, con=engine,
+            if_exists="replace" if first else "append",
+            index=False, method="multi", chunksize=5_000
+        )
+        first = False
+
+
+if __name__ == "__main__":
+    # Kết nối tới MySQL
+    connection_str = f"mysql+pymysql://{username}:{password}@{host}:{port}/{database}"
+    engine = create_engine(connection_str)
+
+    # Upload
+    for table_name, file_name in tables.items():
+        try:
+            upload_csv(engine, table_name, file_name)
+            print(f"✅ Uploaded {file_name} to MySQL table `{table_name}`")
+        except Exception as e:
+            print(f"❌ Failed to upload {file_name}: {e}")